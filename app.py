@@ -1,9 +1,28 @@
+import io
+import time
+
 import pandas as pd
+import requests
 import streamlit as st
+from requests.adapters import HTTPAdapter
 
 st.set_page_config(page_title="Is My Bus Lying? (TTC)", layout="wide")
 
 CSV_URL = "https://raw.githubusercontent.com/andriawong12/is_my_bus_lying/main/data/fragility_by_timeband_latest.csv"
+PARQUET_URL = "https://raw.githubusercontent.com/andriawong12/is_my_bus_lying/main/data/fragility_by_timeband_latest.parquet"
+
+# Pooled session kept across reruns so data fetches reuse a keep-alive connection
+@st.cache_resource
+def http_session() -> requests.Session:
+    session = requests.Session()
+    session.headers.update({"User-Agent": "is-my-bus-lying (+https://github.com/andriawong12/is_my_bus_lying)"})
+    session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=8))
+    return session
+
+def fetch(url: str) -> io.BytesIO:
+    resp = http_session().get(url, timeout=60)
+    resp.raise_for_status()
+    return io.BytesIO(resp.content)
 
 # Time band ordering (must match exactly what your GTFS script outputs)
 BAND_ORDER = [
@@ -15,30 +34,149 @@ BAND_ORDER = [
 ]
 # If your CSV uses hyphens instead of en-dashes, swap to:
 # BAND_ORDER = ["Overnight (0-6)", "AM Peak (6-9)", "Midday (9-15)", "PM Peak (15-19)", "Evening (19-24)"]
+BAND_DTYPE = pd.CategoricalDtype(BAND_ORDER, ordered=True)
+
+# Compact dtypes for the displayed numeric columns: values are small and
+# rounded to 2 decimals before the cast, so float32/Int32/Int8 lose nothing
+# shown and halve the cached frame
+NUMERIC_DTYPES = {
+    "route_id": "Int32",
+    "direction_id": "Int8",
+    "trips": "Int32",
+    "fragility_score": "float32",
+    "median_layover_min": "float32",
+    "runtime_spread_min": "float32",
+}
+
+# Download formatting: score written as percent with 2 decimals
+DISPLAY_FORMATS = {
+    "fragility_score": "{:.2f}%",
+    "median_layover_min": "{:.2f}",
+    "runtime_spread_min": "{:.2f}",
+}
+
+def read_csv_data() -> pd.DataFrame:
+    # Time bands parsed straight into the chronologically ordered categorical
+    df = pd.read_csv(fetch(CSV_URL), dtype={"time_band": BAND_DTYPE})
+
+    # Clamp score to 0..100
+    if "fragility_score" in df.columns:
+        df["fragility_score"] = df["fragility_score"].clip(0, 100)
 
-@st.cache_data(ttl=3600)
-def load_data() -> pd.DataFrame:
-    df = pd.read_csv(CSV_URL)
+    # Older CSVs ordered time bands by name; put rows in display order once here
+    # (route_id asc, direction_id asc, time_band chronological)
+    sort_cols = [c for c in ["route_id", "direction_id", "time_band"] if c in df.columns]
+    if sort_cols:
+        df = df.sort_values(sort_cols, ascending=True, ignore_index=True)
 
-    # Ensure numeric columns are numeric
-    for c in ["route_id", "direction_id", "trips", "fragility_score", "median_layover_min", "runtime_spread_min"]:
+    return df
+
+# ETag of the published data, re-checked hourly (the old load_data ttl). It
+# keys the disk cache below, so a restart reuses the cached frame as long as
+# the data hasn't changed. Falls back to the current hour if the HEAD fails.
+@st.cache_data(ttl=3600, show_spinner=False)
+def data_version() -> str:
+    for url in (PARQUET_URL, CSV_URL):
+        try:
+            resp = http_session().head(url, timeout=30)
+            resp.raise_for_status()
+        except requests.RequestException:
+            continue
+        if resp.headers.get("ETag"):
+            return resp.headers["ETag"]
+    return f"hour-{int(time.time() // 3600)}"
+
+# Data version currently held by the disk cache, shared by all sessions
+@st.cache_resource
+def held_data_version() -> dict:
+    return {"version": None}
+
+# Persisted to disk so a server restart doesn't re-parse the data. Disk-persisted
+# caches ignore ttl, so freshness comes from the data_version argument instead.
+@st.cache_data(persist="disk", max_entries=1, show_spinner=False)
+def load_data(data_version: str) -> pd.DataFrame:
+    # The build script writes a typed parquet next to the CSV; no text parsing
+    # is needed when it's available
+    try:
+        df = pd.read_parquet(fetch(PARQUET_URL))
+    except requests.RequestException:
+        # Parquet not published yet: fall back to the CSV
+        df = read_csv_data()
+
+    # Round metrics to 2 decimals in float64 first: rounding after the float32
+    # cast would shift half-cent values (7.685 -> 7.68 instead of 7.69)
+    for c, t in NUMERIC_DTYPES.items():
+        if t == "float32" and c in df.columns:
+            df[c] = pd.to_numeric(df[c], errors="coerce").round(2)
+
+    # Numeric columns straight to their final dtypes (whole numbers stay whole).
+    # Cast one at a time so a text route_id doesn't block the other casts.
+    for c, t in NUMERIC_DTYPES.items():
         if c in df.columns:
-            df[c] = pd.to_numeric(df[c], errors="coerce")
+            df[c] = df[c].astype(t, errors="ignore")
 
-    # Order time bands chronologically
-    if "time_band" in df.columns:
-        df["time_band"] = pd.Categorical(df["time_band"], categories=BAND_ORDER, ordered=True)
+    # Route IDs as text for the sidebar filter, built once here rather than per keystroke
+    df["_route_id_str"] = df["route_id"].astype("string").fillna("")
 
-    # Clamp score to 0..100
-    if "fragility_score" in df.columns:
-        df["fragility_score"] = df["fragility_score"].clip(0, 100)
+    # Formatted text for the CSV download, built once here rather than per filter
+    for c, fmt in DISPLAY_FORMATS.items():
+        if c in df.columns:
+            df[c + "_disp"] = df[c].map(fmt.format, na_action="ignore").fillna("")
 
     return df
 
+def table_view(df: pd.DataFrame, route_search: str) -> pd.DataFrame:
+    # Optional filter by route_id substring
+    f = df
+    if route_search:
+        f = f[f["_route_id_str"].str.contains(route_search, na=False, regex=False)]
+
+    # Columns (route_short_name removed)
+    cols = [
+        "route_id",
+        "direction_id",
+        "time_band",
+        "fragility_score",
+        "median_layover_min",
+        "runtime_spread_min",
+        "trips",
+        "why",
+    ]
+    return f[[c for c in cols if c in f.columns]]
+
+# Table formatting: the columns stay numeric (so they sort as numbers) and the
+# grid formats them on the client; score shown as percent with 2 decimals
+COLUMN_CONFIG = {
+    "fragility_score": st.column_config.NumberColumn(format="%.2f%%"),
+    "median_layover_min": st.column_config.NumberColumn(format="%.2f"),
+    "runtime_spread_min": st.column_config.NumberColumn(format="%.2f"),
+}
+
+# CSV bytes for the download button, cached per filter so reruns that don't
+# change the filter skip re-serializing the table
+@st.cache_data(max_entries=8, show_spinner=False)
+def encode_download(data_version: str, route_search: str) -> bytes:
+    # Score is percent string, other metrics to 2 decimals
+    df = load_data(data_version)
+    view = table_view(df, route_search)
+    for c in DISPLAY_FORMATS:
+        if c in view.columns:
+            view = view.assign(**{c: df.loc[view.index, c + "_disp"]})
+    return view.to_csv(index=False).encode("utf-8")
+
 st.title("Is My Bus Lying? (TTC Bus Schedule Fragility)")
 st.caption("Data auto-updates via scheduled GitHub Actions. Toggle the table to view.")
 
-df = load_data()
+version = data_version()
+
+# New data published: drop the old frames so disk pickles don't pile up
+held = held_data_version()
+if held["version"] not in (None, version):
+    load_data.clear()
+    encode_download.clear()
+held["version"] = version
+
+df = load_data(version)
 
 # -------------------------
 # UI Controls (start empty + toggle)
@@ -52,71 +190,16 @@ if not show_table:
     st.info("Table is hidden. Toggle **Show table (all rows)** to display it.")
     st.stop()
 
-# Optional filter by route_id substring
-f = df.copy()
-if route_search:
-    rid = pd.to_numeric(f["route_id"], errors="coerce").fillna(-1).astype(int).astype(str)
-    f = f[rid.str.contains(route_search, na=False)].copy()
-
-# Sort: route_id asc, direction_id asc (0 then 1), time_band in your specified order
-sort_cols = [c for c in ["route_id", "direction_id", "time_band"] if c in f.columns]
-if sort_cols:
-    f = f.sort_values(sort_cols, ascending=True)
-
-# Columns (route_short_name removed)
-cols = [
-    "route_id",
-    "direction_id",
-    "time_band",
-    "fragility_score",
-    "median_layover_min",
-    "runtime_spread_min",
-    "trips",
-    "why",
-]
-cols = [c for c in cols if c in f.columns]
-display = f[cols].copy()
-
-# Whole numbers stay whole
-for c in ["route_id", "direction_id", "trips"]:
-    if c in display.columns:
-        display[c] = pd.to_numeric(display[c], errors="coerce").round(0).astype("Int64")
-
-# Round numeric metrics to 2 decimals
-for c in ["median_layover_min", "runtime_spread_min"]:
-    if c in display.columns:
-        display[c] = pd.to_numeric(display[c], errors="coerce").round(2)
-
-# Score rounded to 2 decimals, clamp to <= 100
-if "fragility_score" in display.columns:
-    display["fragility_score"] = (
-        pd.to_numeric(display["fragility_score"], errors="coerce")
-        .clip(0, 100)
-        .round(2)
-    )
+display = table_view(df, route_search)
 
 st.write(f"Rows shown: {len(display):,}")
 
-# Display formatting: score shown as percent with 2 decimals
-fmt = {}
-if "fragility_score" in display.columns:
-    fmt["fragility_score"] = lambda x: "" if pd.isna(x) else f"{float(x):.2f}%"
-for c in ["median_layover_min", "runtime_spread_min"]:
-    if c in display.columns:
-        fmt[c] = "{:.2f}"
-
-st.dataframe(display.style.format(fmt, na_rep=""), use_container_width=True, height=650)
-
-# Download CSV (pretty: score is percent string)
-download_df = display.copy()
-if "fragility_score" in download_df.columns:
-    download_df["fragility_score"] = download_df["fragility_score"].map(
-        lambda x: "" if pd.isna(x) else f"{float(x):.2f}%"
-    )
+st.dataframe(display, use_container_width=True, height=650, column_config=COLUMN_CONFIG)
 
+# Download CSV
 st.download_button(
     "Download current table CSV",
-    data=download_df.to_csv(index=False).encode("utf-8"),
+    data=encode_download(version, route_search),
     file_name="bus_fragility_table.csv",
     mime="text/csv",
 )
@@ -1,278 +1,415 @@
-import io
+import json
+import os
+import tempfile
+import time
 import zipfile
 import requests
+import numpy as np
 import pandas as pd
+import polars as pl
 
 from datetime import date
+from requests.adapters import HTTPAdapter
 
 from pathlib import Path
-Path("data").mkdir(exist_ok=True)
-
-base_url = "https://ckan0.cf.opendata.inter.prod-toronto.ca"
-pkg = requests.get(
-    base_url + "/api/3/action/package_show",
-    params={"id": "merged-gtfs-ttc-routes-and-schedules"},
-    timeout=60
-).json()
-
-resources = pkg["result"]["resources"]
-
-# Heuristic: find the first GTFS zip
-gtfs_res = None
-for r in resources:
-    url = (r.get("url") or "").lower()
-    name = (r.get("name") or "").lower()
-    if url.endswith(".zip") and ("gtfs" in url or "gtfs" in name):
-        gtfs_res = r
-        break
-
-if not gtfs_res:
-    raise RuntimeError("Couldn't find a GTFS zip resource in the package resources.")
-
-gtfs_url = gtfs_res["url"]
-print("Downloading:", gtfs_url)
-
-zbytes = requests.get(gtfs_url, timeout=120).content
-zf = zipfile.ZipFile(io.BytesIO(zbytes))
-
-def read_txt(filename):
-    with zf.open(filename) as f:
-        return pd.read_csv(f, low_memory=False)
-
-routes = read_txt("routes.txt")
-trips = read_txt("trips.txt")
-stop_times = read_txt("stop_times.txt")
-calendar = read_txt("calendar.txt")
-
-weekday_service_ids = set(
-    calendar[
-        (calendar["monday"] == 1) &
-        (calendar["tuesday"] == 1) &
-        (calendar["wednesday"] == 1) &
-        (calendar["thursday"] == 1) &
-        (calendar["friday"] == 1) &
-        (calendar["saturday"] == 0) &
-        (calendar["sunday"] == 0)
-    ]["service_id"].astype(str)
-)
-
-# Bus only: in GTFS, route_type 3 = bus
-bus_routes = routes[routes["route_type"] == 3][["route_id", "route_short_name", "route_long_name"]]
-
-bus_trips = trips.merge(bus_routes, on="route_id", how="inner")
-
-# Convert HH:MM:SS (can exceed 24h) to seconds
-def hms_to_seconds(s):
-    h, m, sec = s.split(":")
-    return int(h)*3600 + int(m)*60 + int(sec)
-
-def time_band_from_sec(sec: float) -> str:
-    s = int(sec) % 86400
-    hour = s // 3600
-
-    if 6 <= hour < 9:
-        return "AM Peak (6–9)"
-    if 9 <= hour < 15:
-        return "Midday (9–15)"
-    if 15 <= hour < 19:
-        return "PM Peak (15–19)"
-    if 19 <= hour < 24:
-        return "Evening (19–24)"
-    return "Overnight (0–6)"
-
-for col in ["arrival_time", "departure_time"]:
-    stop_times[col + "_sec"] = stop_times[col].astype(str).map(hms_to_seconds)
-
-# Compute per-trip runtime using first departure and last arrival
-trip_first = stop_times.sort_values(["trip_id", "stop_sequence"]).groupby("trip_id").first()
-trip_last  = stop_times.sort_values(["trip_id", "stop_sequence"]).groupby("trip_id").last()
-
-runtime = (
-    pd.DataFrame({
-        "trip_id": trip_first.index,
-        "start_sec": trip_first["departure_time_sec"].values,
-        "end_sec": trip_last["arrival_time_sec"].values,
-        "first_stop_id": trip_first["stop_id"].values,
-        "last_stop_id": trip_last["stop_id"].values
-    })
-)
-
-runtime["runtime_min"] = (runtime["end_sec"] - runtime["start_sec"]) / 60.0
-
-bus_trip_runtime = bus_trips.merge(runtime, on="trip_id", how="inner")
-
-bus_trip_runtime["service_id"] = bus_trip_runtime["service_id"].astype(str)
-bus_trip_runtime = bus_trip_runtime[
-    bus_trip_runtime["service_id"].isin(weekday_service_ids)
-].copy()
-
-
-bus_trip_runtime["time_band"] = bus_trip_runtime["start_sec"].map(time_band_from_sec)
-
-# Quick sanity + sample ranking by median runtime (not your final metric)
-summary = (bus_trip_runtime
-           .groupby(["route_id","route_short_name","direction_id","time_band"])
-           .agg(trips=("trip_id","count"),
-                median_runtime_min=("runtime_min","median"),
-                p10_runtime_min=("runtime_min", lambda x: x.quantile(0.10)),
-                p90_runtime_min=("runtime_min", lambda x: x.quantile(0.90)))
-           .reset_index()
-           .sort_values(["trips"], ascending=False)
-)
-
-summary["runtime_spread_min"] = (
-    summary["p90_runtime_min"] - summary["p10_runtime_min"]
-)
-
-# Compute layovers between consecutive trips in the same vehicle block
-block_trips = bus_trip_runtime.copy()
-
-# Sort trips in the order each vehicle runs them
-block_trips = block_trips.sort_values(
-    ["service_id", "block_id", "start_sec"]
-)
-
-# Start time of the next trip in the same vehicle block
-block_trips["next_start_sec"] = (
-    block_trips
-    .groupby(["service_id", "block_id"])["start_sec"]
-    .shift(-1)
-)
-
-block_trips["next_first_stop_id"] = (
-    block_trips
-    .groupby(["service_id", "block_id"])["first_stop_id"]
-    .shift(-1)
-)
-
-# Layover = gap between end of this trip and start of next
-block_trips["layover_min"] = (
-    block_trips["next_start_sec"] - block_trips["end_sec"]
-) / 60.0
-
-block_trips["time_band"] = block_trips["end_sec"].map(time_band_from_sec)
-
-block_trips = block_trips.dropna(subset=["next_start_sec", "next_first_stop_id"])
-
-# Keep only reasonable layovers (ignore long breaks)
-layovers = block_trips[
-    (block_trips["layover_min"] >= 0) &
-    (block_trips["layover_min"] <= 120) &
-    (block_trips["last_stop_id"] == block_trips["next_first_stop_id"])
+
+# One pooled session for the CKAN lookup and the zip download, so the
+# connection (and TLS handshake) is reused across requests
+SESSION = requests.Session()
+SESSION.headers.update({"User-Agent": "is-my-bus-lying (+https://github.com/andriawong12/is_my_bus_lying)"})
+SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=8))
+
+# Signature (ETag / Last-Modified) of the feed used for the last rebuild
+META_PATH = Path(".gtfs_meta.json")
+
+# Bump whenever the code changes what gets written, so the next run rebuilds
+# even if the feed itself hasn't changed
+OUTPUT_VERSION = 2
+
+# Columns read from each GTFS file and their types (None = let polars infer
+# from the whole file, not just the first rows).
+# GTFS times can run past 24:00:00, so they stay strings rather than times.
+ROUTES_TYPES = {
+    "route_id": None,
+    "route_short_name": pl.String,
+    "route_long_name": pl.String,
+    "route_type": pl.Int16,
+}
+TRIPS_TYPES = {
+    "route_id": None,
+    "service_id": pl.String,
+    "trip_id": pl.String,
+    "direction_id": pl.Int8,
+    "block_id": pl.String,
+}
+STOP_TIMES_TYPES = {
+    "trip_id": pl.String,
+    "arrival_time": pl.String,
+    "departure_time": pl.String,
+    "stop_id": pl.String,
+    "stop_sequence": pl.Int32,
+}
+CALENDAR_TYPES = {
+    "service_id": pl.String,
+    **{day: pl.Int8 for day in
+       ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]},
+}
+
+# Rows can be filtered with `where` while the file is scanned, so rows that
+# would be thrown away (e.g. stop_times of non-bus trips) are never loaded
+def read_txt(zf, filename, column_types, where=None):
+    with tempfile.TemporaryDirectory() as tmp:
+        lf = pl.scan_csv(
+            zf.extract(filename, tmp),
+            schema_overrides={c: t for c, t in column_types.items() if t is not None},
+            # Inferring from only the first 100 rows breaks on a later non-numeric ID
+            infer_schema_length=None if None in column_types.values() else 100,
+        ).select(list(column_types))
+        if where is not None:
+            lf = lf.filter(where)
+        return lf.collect()
+
+# Convert a column of HH:MM:SS strings (can exceed 24h) to seconds
+def hms_to_seconds(col: str) -> pl.Expr:
+    parts = pl.col(col).str.split_exact(":", 2).struct
+    return (
+        parts.field("field_0").cast(pl.Int32)*3600 +
+        parts.field("field_1").cast(pl.Int32)*60 +
+        parts.field("field_2").cast(pl.Int32)
+    )
+
+# Time bands in chronological order, with the hour each one starts at
+BAND_ORDER = [
+    "Overnight (0–6)",
+    "AM Peak (6–9)",
+    "Midday (9–15)",
+    "PM Peak (15–19)",
+    "Evening (19–24)",
 ]
+BAND_START_HOURS = np.array([0, 6, 9, 15, 19])
+BAND_ENUM = pl.Enum(BAND_ORDER)
+BAND_DTYPE = pd.CategoricalDtype(BAND_ORDER, ordered=True)
+
+# Band of each hour of the day, so assigning bands is a single lookup per row
+HOUR_TO_BAND = {
+    hour: BAND_ORDER[np.searchsorted(BAND_START_HOURS, hour, side="right") - 1]
+    for hour in range(24)
+}
+
+def time_band_from_sec(col: str) -> pl.Expr:
+    hour = (pl.col(col) % 86400) // 3600
+    return hour.replace_strict(HOUR_TO_BAND, return_dtype=BAND_ENUM)
+
+# Count, median and p10/p90 of a minutes column per group
+# Rows with a missing key are dropped, as pandas groupby does
+def minutes_summary(df: pl.DataFrame, keys, col: str, count_name: str) -> pl.DataFrame:
+    return df.drop_nulls(keys).group_by(keys).agg(
+        pl.col(col).count().alias(count_name),
+        pl.col(col).median().alias(f"median_{col}"),
+        pl.col(col).quantile(0.10, interpolation="linear").alias(f"p10_{col}"),
+        pl.col(col).quantile(0.90, interpolation="linear").alias(f"p90_{col}"),
+    )
+
+SUMMARY_KEYS = ["route_id", "route_short_name", "direction_id", "time_band"]
+
+MIN_TRIPS = 50
+
+def build_fragility(session=None, force: bool = False) -> None:
+    """Download the current TTC GTFS feed and write the fragility tables to data/.
+
+    Does nothing if the feed and OUTPUT_VERSION haven't changed since the last
+    rebuild, unless force is set.
+    """
+    session = session or SESSION
+    Path("data").mkdir(exist_ok=True)
+
+    base_url = "https://ckan0.cf.opendata.inter.prod-toronto.ca"
+    pkg = session.get(
+        base_url + "/api/3/action/package_show",
+        params={"id": "merged-gtfs-ttc-routes-and-schedules"},
+        timeout=60
+    ).json()
+
+    resources = pkg["result"]["resources"]
+
+    # Heuristic: find the first GTFS zip
+    gtfs_res = None
+    for r in resources:
+        url = (r.get("url") or "").lower()
+        name = (r.get("name") or "").lower()
+        if url.endswith(".zip") and ("gtfs" in url or "gtfs" in name):
+            gtfs_res = r
+            break
+
+    if not gtfs_res:
+        raise RuntimeError("Couldn't find a GTFS zip resource in the package resources.")
+
+    gtfs_url = gtfs_res["url"]
+
+    meta = json.loads(META_PATH.read_text()) if META_PATH.exists() else {}
+    saved_sig = meta.get("remote_signature") or {}
+
+    # Conditional GET: the server answers 304 if the feed hasn't changed since the
+    # last rebuild, so freshness is checked and the zip fetched in one request
+    conditional_headers = {}
+    up_to_date_outputs = meta.get("output_version") == OUTPUT_VERSION
+    if not force and up_to_date_outputs and saved_sig.get("gtfs_url") == gtfs_url:
+        if saved_sig.get("etag"):
+            conditional_headers["If-None-Match"] = saved_sig["etag"]
+        if saved_sig.get("last_modified"):
+            conditional_headers["If-Modified-Since"] = saved_sig["last_modified"]
+
+    print("Downloading:", gtfs_url)
+
+    # Stream the zip to a temp file rather than holding the whole download in memory
+    with tempfile.TemporaryFile() as zfile:
+        with session.get(gtfs_url, headers=conditional_headers, stream=True, timeout=120) as resp:
+            if resp.status_code == 304:
+                print("GTFS feed unchanged since the last rebuild; nothing to do.")
+                return
+            resp.raise_for_status()
+            remote_signature = {
+                "content_length": resp.headers.get("Content-Length"),
+                "etag": resp.headers.get("ETag"),
+                "gtfs_url": gtfs_url,
+                "last_modified": resp.headers.get("Last-Modified"),
+            }
+            for chunk in resp.iter_content(chunk_size=1 << 20):
+                zfile.write(chunk)
+
+        with zipfile.ZipFile(zfile) as zf:
+            routes = read_txt(zf, "routes.txt", ROUTES_TYPES)
+            trips = read_txt(zf, "trips.txt", TRIPS_TYPES)
+            # route_id is inferred per file; compare as text if the files disagree
+            if routes["route_id"].dtype != trips["route_id"].dtype:
+                routes = routes.with_columns(pl.col("route_id").cast(pl.String))
+                trips = trips.with_columns(pl.col("route_id").cast(pl.String))
+            calendar = read_txt(zf, "calendar.txt", CALENDAR_TYPES)
+
+            weekday_service_ids = calendar.filter(
+                (pl.col("monday") == 1) &
+                (pl.col("tuesday") == 1) &
+                (pl.col("wednesday") == 1) &
+                (pl.col("thursday") == 1) &
+                (pl.col("friday") == 1) &
+                (pl.col("saturday") == 0) &
+                (pl.col("sunday") == 0)
+            )["service_id"]
+
+            # Bus only: in GTFS, route_type 3 = bus
+            bus_routes = routes.filter(pl.col("route_type") == 3).select(
+                "route_id", "route_short_name", "route_long_name"
+            )
+
+            bus_trips = (
+                trips
+                .join(bus_routes, on="route_id", how="inner")
+                .filter(pl.col("service_id").is_in(weekday_service_ids.implode()))
+            )
+
+            # stop_times is by far the largest file: only load rows for weekday bus trips
+            stop_times = read_txt(
+                zf, "stop_times.txt", STOP_TIMES_TYPES,
+                where=pl.col("trip_id").is_in(bus_trips["trip_id"].implode())
+            )
+
+    # Compute per-trip runtime using first departure and last arrival
+    # (values at each trip's lowest/highest stop_sequence, no sort needed)
+    first = pl.col("stop_sequence").arg_min()
+    last = pl.col("stop_sequence").arg_max()
+    runtime = (
+        stop_times
+        .with_columns(
+            hms_to_seconds("arrival_time").alias("arrival_time_sec"),
+            hms_to_seconds("departure_time").alias("departure_time_sec"),
+        )
+        .group_by("trip_id")
+        .agg(
+            pl.col("departure_time_sec").get(first).alias("start_sec"),
+            pl.col("arrival_time_sec").get(last).alias("end_sec"),
+            pl.col("stop_id").get(first).alias("first_stop_id"),
+            pl.col("stop_id").get(last).alias("last_stop_id"),
+        )
+        .with_columns(
+            ((pl.col("end_sec") - pl.col("start_sec")) / 60.0).alias("runtime_min")
+        )
+    )
 
-# Route-level layover summary
-layover_summary = (
-    layovers
-    .groupby(["route_id", "route_short_name", "direction_id","time_band"])
-    .agg(
-        layovers=("layover_min", "count"),
-        median_layover_min=("layover_min", "median"),
-        p10_layover_min=("layover_min", lambda x: x.quantile(0.10)),
-        p90_layover_min=("layover_min", lambda x: x.quantile(0.90)),
+    bus_trip_runtime = (
+        bus_trips
+        .join(runtime, on="trip_id", how="inner")
+        .with_columns(time_band_from_sec("start_sec").alias("time_band"))
     )
-    .reset_index()
-    .sort_values("median_layover_min")
-)
 
-fragility_base = summary.merge(
-    layover_summary,
-    on=["route_id","route_short_name","direction_id","time_band"],
-    how="left"
-)
+    # Quick sanity + sample ranking by median runtime (not your final metric)
+    summary = (
+        minutes_summary(bus_trip_runtime, SUMMARY_KEYS, "runtime_min", "trips")
+        .with_columns(
+            (pl.col("p90_runtime_min") - pl.col("p10_runtime_min")).alias("runtime_spread_min")
+        )
+        .sort("trips", descending=True)
+    )
+
+    # Compute layovers between consecutive trips in the same vehicle block
+    # (trips without a block_id aren't chained to anything)
+    block = ["service_id", "block_id"]
+    block_trips = (
+        bus_trip_runtime
+        .filter(pl.col("block_id").is_not_null())
+        # Sort trips in the order each vehicle runs them
+        .sort("service_id", "block_id", "start_sec")
+        # Start time and first stop of the next trip in the same vehicle block
+        .with_columns(
+            pl.col("start_sec").shift(-1).over(block).alias("next_start_sec"),
+            pl.col("first_stop_id").shift(-1).over(block).alias("next_first_stop_id"),
+        )
+        .with_columns(
+            # Layover = gap between end of this trip and start of next
+            ((pl.col("next_start_sec") - pl.col("end_sec")) / 60.0).alias("layover_min"),
+            time_band_from_sec("end_sec").alias("time_band"),
+        )
+        .drop_nulls(["next_start_sec", "next_first_stop_id"])
+    )
 
-# Fill missing layovers with a "safe" value (means not fragile on this axis)
-fragility_base["median_layover_min"] = fragility_base["median_layover_min"].fillna(10)
+    # Keep only reasonable layovers (ignore long breaks)
+    layovers = block_trips.filter(
+        (pl.col("layover_min") >= 0) &
+        (pl.col("layover_min") <= 120) &
+        (pl.col("last_stop_id") == pl.col("next_first_stop_id"))
+    )
 
-# --- Robust normalizer for variability ---
-# Use a robust scale: median + 2*IQR (stable, not super sensitive)
-spread = fragility_base["runtime_spread_min"].clip(lower=0)
+    # Route-level layover summary
+    layover_summary = (
+        minutes_summary(layovers, SUMMARY_KEYS, "layover_min", "layovers")
+        .sort("median_layover_min")
+    )
 
-q50 = spread.quantile(0.50)
-iqr = spread.quantile(0.75) - spread.quantile(0.25)
-k = float(q50 + 2 * iqr) if iqr > 0 else float(spread.quantile(0.90))
-k = max(k, 1.0)
+    # Aggregation is done; scoring works on one row per group, in pandas
+    fragility_base = (
+        summary
+        .join(layover_summary, on=SUMMARY_KEYS, how="left")
+        .to_pandas()
+    )
+    fragility_base["time_band"] = fragility_base["time_band"].astype(BAND_DTYPE)
 
-# --- Component scores (both in [0,1), never exactly 1) ---
-lay = fragility_base["median_layover_min"].clip(lower=0)
+    # Fill missing layovers with a "safe" value (means not fragile on this axis)
+    fragility_base["median_layover_min"] = fragility_base["median_layover_min"].fillna(10)
 
-# Layover: 0 -> ~0.95, then decays (prevents instant max)
-fragility_base["layover_score"] = 0.95 / (1 + lay)
+    # --- Robust normalizer for variability ---
+    # Use a robust scale: median + 2*IQR (stable, not super sensitive)
+    spread = fragility_base["runtime_spread_min"].clip(lower=0)
 
-# Variability: bounded growth, never 1
-fragility_base["runtime_score"] = spread / (spread + k)
+    q50 = spread.quantile(0.50)
+    iqr = spread.quantile(0.75) - spread.quantile(0.25)
+    k = float(q50 + 2 * iqr) if iqr > 0 else float(spread.quantile(0.90))
+    k = max(k, 1.0)
 
-# --- Composite score ---
-# Weights sum to 95 so the top is <= 95%
-fragility_base["fragility_score"] = (
-    35 * fragility_base["layover_score"] +
-    60 * fragility_base["runtime_score"]
-).round(2)
+    # --- Component scores (both in [0,1), never exactly 1) ---
+    lay = fragility_base["median_layover_min"].clip(lower=0)
 
-def explain(row):
-    parts = []
-    if row["median_layover_min"] <= 1:
-        parts.append("no recovery time")
-    elif row["median_layover_min"] <= 3:
-        parts.append("very low recovery time")
+    # Layover: 0 -> ~0.95, then decays (prevents instant max)
+    fragility_base["layover_score"] = 0.95 / (1 + lay)
 
-    if row["runtime_spread_min"] >= fragility_base["runtime_spread_min"].quantile(0.90):
-        parts.append("high schedule variability")
+    # Variability: bounded growth, never 1
+    fragility_base["runtime_score"] = spread / (spread + k)
 
-    return ", ".join(parts) if parts else "moderate"
+    # --- Composite score ---
+    # Weights sum to 95 so the top is <= 95%
+    fragility_base["fragility_score"] = (
+        35 * fragility_base["layover_score"] +
+        60 * fragility_base["runtime_score"]
+    ).round(2)
 
-fragility_base["why"] = fragility_base.apply(explain, axis=1)
+    # Plain-language reasons, built from column masks (threshold computed once)
+    high_variability = (
+        fragility_base["runtime_spread_min"] >= fragility_base["runtime_spread_min"].quantile(0.90)
+    )
+    recovery = np.select(
+        [fragility_base["median_layover_min"] <= 1, fragility_base["median_layover_min"] <= 3],
+        ["no recovery time", "very low recovery time"],
+        default=""
+    )
+    fragility_base["why"] = np.select(
+        [(recovery != "") & high_variability, recovery != "", high_variability],
+        [np.char.add(recovery, ", high schedule variability"), recovery, "high schedule variability"],
+        default="moderate"
+    )
 
-MIN_TRIPS = 50
-ranked = fragility_base[fragility_base["trips"] >= MIN_TRIPS] \
-    .sort_values("fragility_score", ascending=False)
-
-print("\nMost fragile bus routes (Is My Bus Lying?):")
-print(
-    ranked[
-        [
-            "route_short_name",
-            "direction_id",
-            "fragility_score",
-            "median_layover_min",
-            "runtime_spread_min",
-            "trips",
-            "why"
+    ranked = fragility_base[fragility_base["trips"] >= MIN_TRIPS] \
+        .sort_values("fragility_score", ascending=False)
+
+    print("\nMost fragile bus routes (Is My Bus Lying?):")
+    print(
+        ranked[
+            [
+                "route_short_name",
+                "direction_id",
+                "fragility_score",
+                "median_layover_min",
+                "runtime_spread_min",
+                "trips",
+                "why"
+            ]
         ]
-    ]
-    .head(15)
-    .to_string(
-        index=False,
-        col_space={
-            "route_short_name": 6,
-            "direction_id": 3,
-            "fragility_score": 6,
-            "median_layover_min": 6,
-            "runtime_spread_min": 6,
-            "trips": 5,
-            "why": 35,
-        }
+        .head(15)
+        .to_string(
+            index=False,
+            col_space={
+                "route_short_name": 6,
+                "direction_id": 3,
+                "fragility_score": 6,
+                "median_layover_min": 6,
+                "runtime_spread_min": 6,
+                "trips": 5,
+                "why": 35,
+            }
+        )
+    )
+
+    # =========================
+    # FINAL OUTPUT
+    # =========================
+
+    today = date.today().isoformat()  # e.g. 2026-01-14
+
+    # Rows are written in the app's display order (time_band sorts chronologically
+    # as an ordered categorical), so the app doesn't need to re-sort
+    out = fragility_base.sort_values(
+        ["route_id", "direction_id", "time_band"],
+        ascending=True
     )
-)
 
-# =========================
-# FINAL OUTPUT
-# =========================
+    out["data_updated_date"] = today
 
-today = date.today().isoformat()  # e.g. 2026-01-14
+    dated_path = f"data/fragility_by_timeband_{today}.csv"
+    latest_path = "data/fragility_by_timeband_latest.csv"
+    # Typed copy for the app: dtypes (incl. the time_band categorical) are baked in
+    parquet_path = "data/fragility_by_timeband_latest.parquet"
 
-out = fragility_base.sort_values(
-    ["route_id", "direction_id", "time_band"],
-    ascending=True
-)
+    out.to_csv(dated_path, index=False)
+    out.to_csv(latest_path, index=False)
+    compact = {"direction_id": "int8", "trips": "int32"}
+    if pd.api.types.is_integer_dtype(out["route_id"]):
+        compact["route_id"] = "int32"
+    out.astype(compact).to_parquet(
+        parquet_path, compression="zstd", index=False
+    )
 
-out["data_updated_date"] = today
+    print(f"Saved {dated_path}")
+    print(f"Saved {latest_path}")
+    print(f"Saved {parquet_path}")
 
-dated_path = f"data/fragility_by_timeband_{today}.csv"
-latest_path = "data/fragility_by_timeband_latest.csv"
+    META_PATH.write_text(json.dumps(
+        {
+            "output_version": OUTPUT_VERSION,
+            "rebuilt_at_epoch": int(time.time()),
+            "remote_signature": remote_signature,
+        },
+        indent=2,
+        sort_keys=True
+    ))
 
-out.to_csv(dated_path, index=False)
-out.to_csv(latest_path, index=False)
 
-print(f"Saved {dated_path}")
-print(f"Saved {latest_path}")
+if __name__ == "__main__":
+    # FORCE_REBUILD=true rebuilds even if the feed is unchanged
+    build_fragility(force=os.environ.get("FORCE_REBUILD", "").lower() in ("1", "true"))